@@ -1,16 +1,31 @@
 import boto3
 import os
 import pprint
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from awsdesktop import aws_utils
 from awsdesktop import send_data_to_aws
 
+# job statuses listed on the dashboard, also the order they are queried in
+JOB_STATES = ('RUNNING', 'SUCCEEDED', 'FAILED', 'PENDING', 'RUNNABLE', 'STARTING', 'SUBMITTED')
+# job states that are final, neither the job details nor its logs change any more
+FINISHED_JOB_STATES = ('SUCCEEDED', 'FAILED')
+# details of finished jobs by job id, oldest dropped first
+FINISHED_JOB_DETAILS_MAXSIZE = 256
+finished_job_details = {}
+finished_job_details_lock = threading.Lock()
+
 # comma separated filter criteria, this filters by queue name
 def get_all_jobs_queues(start_date_time, end_date_time, filter='pp'):
-    list_filter = filter.split(',')
-    list_of_job_queues = []
-    for item in list_filter:
-        list = list_job_queues(item)
-        list_of_job_queues.extend(list)
+    # normalize the form input so repeated searches hit the same cache entry
+    list_filter = tuple(item.strip() for item in filter.split(','))
+    return get_jobs_for_filters(start_date_time.strip(), end_date_time.strip(), list_filter)
+
+# users re-submit the same search while refreshing the dashboard, a short ttl
+# still picks up new jobs
+@aws_utils.ttl_cache(ttl_seconds=60)
+def get_jobs_for_filters(start_date_time, end_date_time, list_filter):
+    list_of_job_queues = list_job_queues(list_filter)
 
     #pp = pprint.PrettyPrinter(indent=4)
     #pp.pprint(list_sfn)
@@ -18,10 +33,15 @@ def get_all_jobs_queues(start_date_time, end_date_time, filter='pp'):
     list_of_job_executions = list_jobs(list_of_job_queues, start_date_time, end_date_time)
     #pp.pprint(list_of_job_executions)
 
-    return  list_of_job_executions
+    # a tuple, the cached value is shared by every caller
+    return  tuple(list_of_job_executions)
 
 
+# job queues rarely change, avoid a full describe_job_queues scan per dashboard click
+@aws_utils.ttl_cache(ttl_seconds=300, refresh_in_background=True)
 def list_job_queues(filter='pp'):
+    # a tuple of filters is matched in a single describe_job_queues scan
+    filters = (filter,) if isinstance(filter, str) else filter
     job_queue_list = []
     batch = aws_utils.get_boto3_client('batch')
     response = batch.describe_job_queues()
@@ -30,9 +50,7 @@ def list_job_queues(filter='pp'):
     print(response['jobQueues']) #stateMachineArn
     if  'jobQueues' in response and response['jobQueues'] and len(response['jobQueues']) > 0:
         for item_dict in response['jobQueues']:
-            if filter == '*' and 'ENABLED' in item_dict['state'] and 'VALID' in item_dict['status']:
-                job_queue_list.append(item_dict['jobQueueArn'])
-            elif filter in item_dict['jobQueueArn'] and 'ENABLED' in item_dict['state'] and 'VALID' in item_dict['status']:
+            if is_selected_queue(item_dict, filters):
                 job_queue_list.append(item_dict['jobQueueArn'])
 
 
@@ -42,18 +60,23 @@ def list_job_queues(filter='pp'):
         )
         if 'jobQueues' in response and response['jobQueues'] and len(response['jobQueues']) > 0:
             for item_dict in response['jobQueues']:
-                if filter == '*' and 'ENABLED' in item_dict['state'] and 'VALID' in item_dict['status']:
-                    job_queue_list.append(item_dict['jobQueueArn'])
-                elif filter in item_dict['jobQueueArn'] and 'ENABLED' in item_dict['state'] and 'VALID' in item_dict[
-                    'status']:
+                if is_selected_queue(item_dict, filters):
                     job_queue_list.append(item_dict['jobQueueArn'])
 
-    return job_queue_list
+    # a tuple, the cached value is shared by every caller and the background refresh
+    return tuple(job_queue_list)
+
+# enabled, valid queues whose arn contains any of the filters, '*' selects all
+def is_selected_queue(item_dict, filters):
+    if 'ENABLED' not in item_dict['state'] or 'VALID' not in item_dict['status']:
+        return False
+    return '*' in filters or any(filter in item_dict['jobQueueArn'] for filter in filters)
+
 #allowed_states=['RUNNING','SUCCEEDED', 'FAILED', 'PENDING', 'RUNNABLE','STARTING','SUBMITTED']
 #allowed_states=['SUCCEEDED
 # unlike the step function execution list wherein the list are returned in descending order, the jobs executions are not returned in any particular order
 # hence using max iteration count
-def list_jobs(job_queue_list, filter_start_time_in, filter_end_time_in, max_iter_count = 21, allowed_states=['RUNNING', 'SUCCEEDED', 'FAILED', 'PENDING', 'RUNNABLE', 'STARTING', 'SUBMITTED'], ):
+def list_jobs(job_queue_list, filter_start_time_in, filter_end_time_in, max_iter_count = 21, allowed_states=JOB_STATES, ):
     list_of_job_executions = []
     batch = aws_utils.get_boto3_client('batch')
     filter_start_time = get_timestamp_from_str(filter_start_time_in)
@@ -61,39 +84,48 @@ def list_jobs(job_queue_list, filter_start_time_in, filter_end_time_in, max_iter
     # The Amazon Resource Name (ARN) of the state machine to execute.
     # Example - arn:aws:states:us-west-2:112233445566:stateMachine:HelloWorld-StateMachine
     #STATE_MACHINE_ARN = 'arn:aws:states:us-east-1:123456678:stateMachine:pp-devl-workflow-v01'
-    state = ''
     #max_iter_count = 20
-    current_loop_count = 0
-    for q in job_queue_list:
-        current_loop_count = 0
-        for s in  allowed_states:
-            current_loop_count = 1
-            response = batch.list_jobs( jobQueue = q, jobStatus = s)
-            #pp = pprint.PrettyPrinter(indent=4)
-            #pp.pprint(response)
-            #print(response['executions'])
-            if 'jobSummaryList' in response and response['jobSummaryList'] and len(response['jobSummaryList']) > 0:
-                for item_dict in response['jobSummaryList']:
-                    if item_dict['status'] in allowed_states:
-                        check_status(batch, item_dict, list_of_job_executions, filter_start_time, filter_end_time, q)
-
-            while 'nextToken' in response.keys():
-                # pp = pprint.PrettyPrinter(indent=4)
-                # pp.pprint(response)
-                current_loop_count = current_loop_count + 1
-                if max_iter_count == current_loop_count:
-                    break;
-                response = batch.list_jobs(  jobQueue = q, jobStatus = s, nextToken = response['nextToken'])
-                if 'jobSummaryList' in response and response['jobSummaryList'] and len(response['jobSummaryList']) > 0:
-                    for item_dict in response['jobSummaryList']:
-                        if item_dict['status'] in allowed_states:
-                            check_status(batch, item_dict, list_of_job_executions, filter_start_time,
-                                                 filter_end_time, q)
+    # each queue/status listing is an independent round trip, run them concurrently
+    queue_states = [(q, s) for q in job_queue_list for s in allowed_states]
+    with ThreadPoolExecutor(max_workers=aws_utils.MAX_WORKERS) as executor:
+        results = executor.map(lambda queue_state: list_jobs_by_status(batch, queue_state[0], queue_state[1], filter_start_time,
+                                                                        filter_end_time, max_iter_count, allowed_states),
+                               queue_states)
+        # map keeps the queue/status order of the serial version
+        for result in results:
+            list_of_job_executions.extend(result)
 
     pp = pprint.PrettyPrinter(indent=4)
     pp.pprint(list_of_job_executions)
     return list_of_job_executions
 
+def list_jobs_by_status(batch, q, s, filter_start_time, filter_end_time, max_iter_count, allowed_states):
+    list_of_job_executions = []
+    current_loop_count = 1
+    response = batch.list_jobs( jobQueue = q, jobStatus = s)
+    #pp = pprint.PrettyPrinter(indent=4)
+    #pp.pprint(response)
+    #print(response['executions'])
+    if 'jobSummaryList' in response and response['jobSummaryList'] and len(response['jobSummaryList']) > 0:
+        for item_dict in response['jobSummaryList']:
+            if item_dict['status'] in allowed_states:
+                check_status(batch, item_dict, list_of_job_executions, filter_start_time, filter_end_time, q)
+
+    while 'nextToken' in response.keys():
+        # pp = pprint.PrettyPrinter(indent=4)
+        # pp.pprint(response)
+        current_loop_count = current_loop_count + 1
+        if max_iter_count == current_loop_count:
+            break;
+        response = batch.list_jobs(  jobQueue = q, jobStatus = s, nextToken = response['nextToken'])
+        if 'jobSummaryList' in response and response['jobSummaryList'] and len(response['jobSummaryList']) > 0:
+            for item_dict in response['jobSummaryList']:
+                if item_dict['status'] in allowed_states:
+                    check_status(batch, item_dict, list_of_job_executions, filter_start_time,
+                                         filter_end_time, q)
+
+    return list_of_job_executions
+
 import datetime
 def check_status(batch, item_dict, list_of_job_executions, filter_start_time, filter_end_time, q):
     job_name = item_dict['jobName']
@@ -118,15 +150,14 @@ def check_status(batch, item_dict, list_of_job_executions, filter_start_time, fi
         else:
             job_stop_date = 'NA'
 
-    job_start_timestamp = get_datetime_from_num(job_start_date)
     if job_start_date < filter_start_time:
         # skip
         return
 
-    start_date_str =  get_timestamp_str(job_start_timestamp)
-    stop_date_str  = get_timestamp_str(get_datetime_from_num(job_stop_date))
-
     if job_start_date >= filter_start_time and job_start_date <= filter_end_time:
+        # only format jobs that make it into the result
+        start_date_str =  get_timestamp_str(get_datetime_from_num(job_start_date))
+        stop_date_str  = get_timestamp_str(get_datetime_from_num(job_stop_date))
         result = '{0},{1},{2},{3},{4},{5},{6}'.format(q, start_date_str, stop_date_str, job_name, job_id, job_arn, status)
         #print(result)
         list_of_job_executions.append(result)
@@ -139,6 +170,22 @@ def check_status(batch, item_dict, list_of_job_executions, filter_start_time, fi
 #["jobs][0]["container"][ "taskArn"]
 #["jobs][0]["container"][ "command"]
 def get_batch_job_details(job_id):
+    # the details page and the log download both describe the same job,
+    # a finished job is only described once
+    with finished_job_details_lock:
+        job_details_map = finished_job_details.get(job_id)
+    if job_details_map is not None:
+        return job_details_map
+
+    job_details_map = describe_batch_job(job_id)
+    if job_details_map.get("status") in FINISHED_JOB_STATES:
+        with finished_job_details_lock:
+            if job_id not in finished_job_details and len(finished_job_details) >= FINISHED_JOB_DETAILS_MAXSIZE:
+                finished_job_details.pop(next(iter(finished_job_details)))
+            finished_job_details[job_id] = job_details_map
+    return job_details_map
+
+def describe_batch_job(job_id):
     batch = aws_utils.get_boto3_client('batch')
     response = batch.describe_jobs(jobs=[job_id,])
     job_details_map = {}
@@ -1,22 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
 from awsdesktop import aws_utils
 
 
 
 def getMyclusterInfo(cluster_name):
     client = aws_utils.get_boto3_client('emr')
-    response = client.list_clusters(
+    # list_clusters returns 50 clusters per page, pages are only requested
+    # until the cluster is found
+    paginator = client.get_paginator('list_clusters')
+    page_iterator = paginator.paginate(
         ClusterStates=['RUNNING', 'WAITING']
     )
     cluster_id = ''
+    # lower the searched name once, not once per cluster
+    cluster_name_lower = cluster_name.lower()
     #print(response)
-    for cluster in response['Clusters']:
-        if cluster['Name'] and cluster['Name'].lower() == cluster_name.lower():
-            print('Name {0}'.format(cluster['Name']))
-            print('Cluster Id {0}'.format(cluster['Id']))
-            #print('State {0}'.format(cluster['Status']))
-            #print(cluster)
-            cluster_id = cluster['Id']
-            break
+    for response in page_iterator:
+        for cluster in response['Clusters']:
+            if cluster['Name'] and cluster['Name'].lower() == cluster_name_lower:
+                print('Name {0}'.format(cluster['Name']))
+                print('Cluster Id {0}'.format(cluster['Id']))
+                #print('State {0}'.format(cluster['Status']))
+                #print(cluster)
+                cluster_id = cluster['Id']
+                return cluster_id
 
     return cluster_id
 
@@ -28,15 +35,16 @@ def get_cluster_info(filter=''):
     )
     cluster_id = ''
     #print(response)
-    for cluster in response['Clusters']:
-        cluster_name =  cluster['Name']
-        if filter not in cluster_name:
-            continue
-        cluster_id = cluster['Id']
-        cluster_status = cluster['Status']['State']
-        master_node_ip = getMasterIPAddress(cluster_id)
-        nameandid = cluster_name + " || " + cluster_status + " || " + cluster_id + " || " +  master_node_ip
-        list.append(nameandid)
+    clusters = [cluster for cluster in response['Clusters'] if filter in cluster['Name']]
+    # one describe_cluster round trip per cluster, run them concurrently
+    with ThreadPoolExecutor(max_workers=aws_utils.MAX_WORKERS) as executor:
+        master_node_ips = executor.map(getMasterIPAddress, [cluster['Id'] for cluster in clusters])
+        for cluster, master_node_ip in zip(clusters, master_node_ips):
+            cluster_name =  cluster['Name']
+            cluster_id = cluster['Id']
+            cluster_status = cluster['Status']['State']
+            nameandid = cluster_name + " || " + cluster_status + " || " + cluster_id + " || " +  master_node_ip
+            list.append(nameandid)
 
     return list
 
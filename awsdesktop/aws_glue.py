@@ -5,6 +5,7 @@ import os, time
 
 import os, time
 from dateutil import tz
+from awsdesktop import aws_utils
 if os.name == 'nt':
     def _naive_is_dst(self, dt):
         timestamp = tz.tz._datetime_to_timestamp(dt)
@@ -20,7 +21,9 @@ tz.tzlocal._naive_is_dst = _naive_is_dst
 def get_boto3_client(service='glue'):
     # os.environ['HTTPS_PROXY'] = 'proxy.com:10000'
     # os.environ['HTTP_PROXY'] = 'proxy.com:10000'
-    return boto3.client(service)
+    #return boto3.client(service)
+    # reuse the app's cached clients instead of building one per call
+    return aws_utils.get_boto3_client(service)
 
 def get_databases():
     """
@@ -47,12 +50,13 @@ def get_tables_for_database(database):
             PaginationConfig={"PageSize": 100, "StartingToken": starting_token},
         )
         for elem in response_iterator:
-            tables += [
+            # extend from a generator, no intermediate list per page
+            tables.extend(
                 {
                     "name": table["Name"],
                 }
                 for table in elem["TableList"]
-            ]
+            )
             try:
                 starting_token = elem["NextToken"]
             except:
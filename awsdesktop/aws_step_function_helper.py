@@ -1,10 +1,18 @@
 import boto3
 import os
 import pprint
+from concurrent.futures import ThreadPoolExecutor
 from awsdesktop import aws_utils
 from awsdesktop import send_data_to_aws
 
+# execution statuses listed on the dashboard
+EXECUTION_STATES = ('RUNNING', 'SUCCEEDED', 'FAILED', 'ABORTED')
+
+# state machines rarely change, avoid a full list_state_machines scan per dashboard click
+@aws_utils.ttl_cache(ttl_seconds=300, refresh_in_background=True)
 def list_step_functions(filter='pp-'):
+    # a tuple of filters is matched in a single list_state_machines scan
+    filters = (filter,) if isinstance(filter, str) else filter
     sfn_list = []
     sfn = aws_utils.get_boto3_client('stepfunctions')
     response = sfn.list_state_machines()
@@ -13,7 +21,7 @@ def list_step_functions(filter='pp-'):
     #print(response['stateMachines']) #stateMachineArn
     if  'stateMachines' in response and response['stateMachines'] and len(response['stateMachines']) > 0:
         for item_dict in response['stateMachines']:
-            if filter in item_dict['stateMachineArn']:
+            if any(filter in item_dict['stateMachineArn'] for filter in filters):
                 sfn_list.append(item_dict['stateMachineArn'])
 
 
@@ -23,12 +31,13 @@ def list_step_functions(filter='pp-'):
         )
         if 'stateMachines' in response and response['stateMachines'] and len(response['stateMachines']) > 0:
             for item_dict in response['stateMachines']:
-                if filter in item_dict['stateMachineArn']:
+                if any(filter in item_dict['stateMachineArn'] for filter in filters):
                     sfn_list.append(item_dict['stateMachineArn'])
 
-    return sfn_list
+    # a tuple, the cached value is shared by every caller and the background refresh
+    return tuple(sfn_list)
 
-def list_executions(list_state_machine, filter_start_time_in, filter_end_time_in, allowed_states=['RUNNING','SUCCEEDED', 'FAILED', 'ABORTED'],):
+def list_executions(list_state_machine, filter_start_time_in, filter_end_time_in, allowed_states=EXECUTION_STATES,):
     list_of_executions = []
     #sfn = boto3.client('stepfunctions')
     sfn = aws_utils.get_boto3_client('stepfunctions')
@@ -37,40 +46,55 @@ def list_executions(list_state_machine, filter_start_time_in, filter_end_time_in
     # The Amazon Resource Name (ARN) of the state machine to execute.
     # Example - arn:aws:states:us-west-2:112233445566:stateMachine:HelloWorld-StateMachine
     #STATE_MACHINE_ARN = 'arn:aws:states:us-east-1:112233445566:stateMachine:ygpp-devl-workflow-v01'
+    # each state machine is paged independently, list them concurrently on the
+    # shared (thread safe) client, map keeps the results in state machine order
+    with ThreadPoolExecutor(max_workers=aws_utils.MAX_WORKERS) as executor:
+        for executions in executor.map(
+                lambda sm: list_executions_by_state_machine(sfn, sm, filter_start_time, filter_end_time, allowed_states),
+                list_state_machine):
+            list_of_executions.extend(executions)
+
+    pp = pprint.PrettyPrinter(indent=4)
+    pp.pprint(list_of_executions)
+    return list_of_executions
+
+def list_executions_by_state_machine(sfn, sm, filter_start_time, filter_end_time, allowed_states):
+    list_of_executions = []
+    # the stop is per state machine, the next one starts again from its newest execution
     state = ''
-    for sm in list_state_machine:
-        response = sfn.list_executions( stateMachineArn = sm)
-        #pp = pprint.PrettyPrinter(indent=4)
-        #pp.pprint(response)
-        #print(response['executions'])
+    response = sfn.list_executions( stateMachineArn = sm)
+    #pp = pprint.PrettyPrinter(indent=4)
+    #pp.pprint(response)
+    #print(response['executions'])
+    if 'executions' in response and response['executions'] and len(response['executions']) > 0:
+        for item_dict in response['executions']:
+            if is_before_window(item_dict, filter_start_time):
+                state = 'stop'
+                break;
+            if item_dict['status'] in allowed_states:
+                check_status(sfn, item_dict, list_of_executions, filter_start_time, filter_end_time)
+
+    while state != 'stop' and 'nextToken' in response.keys():
+        # pp = pprint.PrettyPrinter(indent=4)
+        # pp.pprint(response)
+        response = sfn.list_executions( stateMachineArn=sm, nextToken = response['nextToken'])
         if 'executions' in response and response['executions'] and len(response['executions']) > 0:
             for item_dict in response['executions']:
-                if item_dict['status'] in allowed_states:
-                    state = check_status(sfn, item_dict, list_of_executions, filter_start_time, filter_end_time)
-                    if state == 'stop':
-                        break;
-
-        if state != 'stop':
-            while 'nextToken' in response.keys():
-                if state == 'stop':
+                if is_before_window(item_dict, filter_start_time):
+                    state = 'stop'
                     break;
-                # pp = pprint.PrettyPrinter(indent=4)
-                # pp.pprint(response)
-                response = sfn.list_executions( stateMachineArn=sm, nextToken = response['nextToken'])
-                if 'executions' in response and response['executions'] and len(response['executions']) > 0:
-                    for item_dict in response['executions']:
-                        if item_dict['status'] in allowed_states:
-                            state = check_status(sfn, item_dict, list_of_executions, filter_start_time, filter_end_time)
-                            if state == 'stop':
-                                break;
+                if item_dict['status'] in allowed_states:
+                    check_status(sfn, item_dict, list_of_executions, filter_start_time, filter_end_time)
 
-    pp = pprint.PrettyPrinter(indent=4)
-    pp.pprint(list_of_executions)
     return list_of_executions
 
+# executions are listed newest first, once one started before the window
+# so did every execution on the remaining pages, whatever its status
+def is_before_window(item_dict, filter_start_time):
+    return item_dict['startDate'].timestamp() < filter_start_time
+
 import datetime
 def check_status(sfn, item_dict, list_of_executions, filter_start_time, filter_end_time):
-    state = ''
     executionArn = item_dict['executionArn']
     applicationId = ''
 
@@ -86,20 +110,15 @@ def check_status(sfn, item_dict, list_of_executions, filter_start_time, filter_e
         stop_date = item_dict['stopDate']
 
     start_timestamp = start_date.timestamp()
-    if start_timestamp < filter_start_time:
-        # stop
-        state = 'stop'
-
-    start_date_str =  get_timestamp_str(start_date)
-    stop_date_str  = get_timestamp_str(stop_date)
-    name = '{0} {1} {2} {3}'.format(item_dict['name'], applicationId, start_date_str, stop_date_str)
     if start_timestamp >= filter_start_time and start_timestamp <= filter_end_time:
+        # only format executions that make it into the result
+        start_date_str =  get_timestamp_str(start_date)
+        stop_date_str  = get_timestamp_str(stop_date)
+        name = '{0} {1} {2} {3}'.format(item_dict['name'], applicationId, start_date_str, stop_date_str)
         result = '{0},{1},{2},{3},{4},{5}'.format(name, status, stateMachineArn.split(':')[-1], start_date_str, stop_date_str, executionArn)
         #print(result)
         list_of_executions.append(result)
 
-    return state
-
 import json
 
 
@@ -108,25 +127,42 @@ def getExecutionAppId(executionArn):
     return getExecutionDetails(sfn, executionArn)
 
 import json
+import itertools
 from flask import send_file
 
 def getExecutionDetails(sfn, executionArn):
-    execution_history = sfn.get_execution_history(executionArn=executionArn)
+    # a single get_execution_history call stops at 1000 events, page through
+    # the whole history instead
+    paginator = sfn.get_paginator('get_execution_history')
+    page_iterator = paginator.paginate(executionArn=executionArn)
     #print(execution_history)
-    applicationId = ''
-    dataList = execution_history['events']
-    listToStr = ' '.join([str(elem) for elem in dataList])
-    localdir = send_data_to_aws.getLocalDir()
     filename = executionArn.split(':')[-1]
-    filewithpath = localdir + filename
     #jsonData = json.dumps(dataList)
-    f = open(filewithpath, "w")
-    f.write(listToStr)
-    f.close()
-    return zip_file(listToStr, filewithpath, filename)
+    chunks = get_history_chunks(page_iterator)
+    # fetch the first page before the response starts, so aws errors are still reported by the caller
+    first_chunk = next(chunks, None)
+    if first_chunk is not None:
+        chunks = itertools.chain([first_chunk], chunks)
+    # zip page by page straight into the response, no local file and no
+    # whole archive in memory
+    zip_stream = aws_utils.stream_zip(filename, chunks)
+    return send_data_to_aws.zip_response(zip_stream, '{0}.zip'.format(filename))
+
+def get_history_chunks(page_iterator):
+    index = 0
+    for page in page_iterator:
+        # gather the page's events as bytes and hand the zip one write per page,
+        # not two small writes (and compress calls) per event
+        page_bytes = bytearray()
+        for elem in page['events']:
+            if index:
+                page_bytes.extend(b' ')
+            page_bytes.extend(str(elem).encode('utf-8'))
+            index += 1
+        if page_bytes:
+            yield bytes(page_bytes)
 
 
-import io
 import zipfile
 import time
 def zip_file1(info, filewithpath, filename, localdir):
@@ -145,18 +181,6 @@ def zip_file1(info, filewithpath, filename, localdir):
     return send_file(file_zip, mimetype='application/zip', attachment_filename=file_name_zip, as_attachment=True)
 
 
-def zip_file(info, filewithpath, filename):
-    memory_file = io.BytesIO()
-    with zipfile.ZipFile(memory_file, 'w') as zf:
-        zf.write(filewithpath)
-    memory_file.seek(0)
-    file_zip = '{0}.zip'.format(filename)
-    #return send_file(memory_file, attachment_filename=file_zip, as_attachment=True)
-    return send_file(memory_file, mimetype='application/zip', attachment_filename=file_zip, as_attachment=True)
-
-
-
-
 def getExecutionDetails_prev(sfn, executionArn):
     execution_history = sfn.get_execution_history(executionArn=executionArn)
     #print(execution_history)
@@ -192,11 +216,15 @@ def getExecutionDetails1(sfn, executionArn):
 
 
 def get_executions_by_step_func_arn(start_date_time, end_date_time, filter='pp'):
-    list_filter = filter.split(',')
-    list_sfn = []
-    for item in list_filter:
-        list = list_step_functions(item)
-        list_sfn.extend(list)
+    # normalize the form input so repeated searches hit the same cache entry
+    list_filter = tuple(item.strip() for item in filter.split(','))
+    return get_executions_for_filters(start_date_time.strip(), end_date_time.strip(), list_filter)
+
+# users re-submit the same search while refreshing the dashboard, a short ttl
+# still picks up new executions
+@aws_utils.ttl_cache(ttl_seconds=60)
+def get_executions_for_filters(start_date_time, end_date_time, list_filter):
+    list_sfn = list_step_functions(list_filter)
 
     pp = pprint.PrettyPrinter(indent=4)
     pp.pprint(list_sfn)
@@ -204,7 +232,8 @@ def get_executions_by_step_func_arn(start_date_time, end_date_time, filter='pp')
     list_of_executions = list_executions(list_sfn, start_date_time, end_date_time)
     pp.pprint(list_of_executions)
 
-    return  list_of_executions
+    # a tuple, the cached value is shared by every caller
+    return  tuple(list_of_executions)
 
 #2020-12-01 07:00:00
 #20201201125826782000
@@ -23,16 +23,33 @@ def __parse_line__(input):
 
 # read aws credential tokens
 from pathlib import Path
+import functools
 import os
+import threading
 import boto3
+from botocore.config import Config
+
+# shared by every client: adaptive retries ride out throttling on the parallel
+# listings and the larger pool keeps their connections alive
+CLIENT_CONFIG = Config(retries={'max_attempts': 5, 'mode': 'adaptive'}, max_pool_connections=50)
+# threads per concurrent fan-out, several requests can fan out at once on the
+# same client so one of them only takes a fifth of its 50 connections
+MAX_WORKERS = 10
+# sessions are not thread safe, parallel workers asking for the same client
+# must not each create one
+__client_lock__ = threading.Lock()
 
 
 def get_boto3_resource(service='s3'):
     # os.environ['HTTPS_PROXY'] = 'proxy.com:10009'
     # os.environ['HTTP_PROXY'] = 'proxy.com:10009'
-    session = boto3.session.Session()
-    return session.resource(service)
     #return boto3.resource(service)
+    # resources are not thread safe and the dev server runs each request on a
+    # new thread, so a resource is still created per call, but from the shared
+    # session whose credentials and service models are already loaded
+    credentials_mtime = __credentials_mtime__()
+    with __client_lock__:
+        return __cached_session__(credentials_mtime).resource(service, config=CLIENT_CONFIG)
 
 
 def get_boto3_client(service='s3'):
@@ -42,9 +59,119 @@ def get_boto3_client(service='s3'):
     #aws_access_key_id, aws_secret_access_key, aws_session_token, region = getAWSKeys()
     #os.environ['AWS_ACCESS_KEY_ID'] = aws_access_key_id
     #os.environ['AWS_SECRET_ACCESS_KEY'] = aws_secret_access_key
-    session = boto3.session.Session()
-    return session.client(service)
-
+    # client creation loads the service model and is slow, reuse clients
+    # until the credentials file is rewritten with fresh tokens
+    credentials_mtime = __credentials_mtime__()
+    with __client_lock__:
+        return __cached_client__(service, credentials_mtime)
+
+
+@functools.lru_cache(maxsize=32)
+def __cached_client__(service, credentials_mtime):
+    return __cached_session__(credentials_mtime).client(service, config=CLIENT_CONFIG)
+
+
+# one session per credentials file version, its credentials and loaded
+# service models are reused by all the clients created from it
+@functools.lru_cache(maxsize=1)
+def __cached_session__(credentials_mtime):
+    return boto3.session.Session()
+
+
+def __credentials_mtime__():
+    credentials_file = os.environ.get('AWS_SHARED_CREDENTIALS_FILE',
+                                      str(Path.home()) + os.path.sep + '.aws' + os.path.sep + 'credentials')
+    try:
+        return os.path.getmtime(credentials_file)
+    except OSError:
+        return None
+
+
+import time
+
+# memoize a function's result per positional args for ttl_seconds,
+# used for aws listings that rarely change between clicks.
+# with refresh_in_background an expired entry is still returned right away
+# and reloaded on a daemon thread, so only the very first call waits on aws
+def ttl_cache(ttl_seconds=300, maxsize=128, refresh_in_background=False):
+    def decorator(func):
+        cache = {}
+        refreshing = set()
+        lock = threading.Lock()
+
+        def load(args):
+            value = func(*args)
+            with lock:
+                if args not in cache and len(cache) >= maxsize:
+                    # drop the oldest entry
+                    cache.pop(next(iter(cache)))
+                cache[args] = (time.monotonic(), value)
+            return value
+
+        def refresh(args):
+            try:
+                load(args)
+            except Exception as e:
+                print('Background refresh of {0} failed: {1}'.format(func.__name__, e))
+            finally:
+                with lock:
+                    refreshing.discard(args)
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            now = time.monotonic()
+            with lock:
+                entry = cache.get(args)
+                if entry and now - entry[0] < ttl_seconds:
+                    return entry[1]
+                if entry and refresh_in_background:
+                    if args not in refreshing:
+                        refreshing.add(args)
+                        threading.Thread(target=refresh, args=(args,), daemon=True).start()
+                    return entry[1]
+            return load(args)
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+
+import io
+import zipfile
+
+# unseekable sink for ZipFile, zipfile then writes data descriptors instead of
+# seeking back, so archive bytes can be handed out as soon as they are written
+class ZipStreamBuffer(io.RawIOBase):
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+# yields a zip archive holding file_name, whose content is the byte chunks,
+# without ever holding the whole archive in memory. log text deflates to a
+# fraction of its size, the default ZIP_STORED sent it uncompressed.
+# the member size is not known up front, force_zip64 lets it grow past 2 GiB
+def stream_zip(file_name, chunks):
+    sink = ZipStreamBuffer()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        with zf.open(file_name, 'w', force_zip64=True) as member:
+            for chunk in chunks:
+                member.write(chunk)
+                data = sink.drain()
+                if data:
+                    yield data
+    yield sink.drain()
 
 
 def getAWSKeys() :
@@ -1,11 +1,25 @@
 import traceback
-from flask import Flask, render_template, request, send_file, jsonify, abort,  send_from_directory
+from flask import Flask, Response, render_template, request, send_file, jsonify, abort,  send_from_directory
 from flask_cors import CORS
 import botocore
 import os
+from concurrent.futures import ThreadPoolExecutor
 import sys
 import boto3
 import json
+import re
+import time
+import itertools
+import hashlib
+import tempfile
+import subprocess
+import webbrowser
+from collections import deque
+from datetime import datetime, timedelta
+from dateutil.parser import parse
+from dateutil.tz import tzutc
+#from . import aws_utils
+import awsdesktop.aws_utils as aws_utils
 
 #import awsdesktop
 
@@ -72,10 +86,6 @@ def getbuckets():
         mimetype='application/json'
     )
 
-@app.errorhandler(Exception)
-def all_exception_handler(e):
-    error = str(traceback.format_exc())
-
 @app.errorhandler(500)
 def internal_server_error(error):
     app.logger.error('Server Error: %s', (error))
@@ -286,8 +296,7 @@ def listgroups():
         #list
         try:
             #logs_client = boto3.client("logs")
-            logs_client = aws_utils.get_boto3_client('logs')
-            list = list_groups(logs_client, loggroupfilter)
+            list = list_groups(loggroupfilter)
         except Exception as e:
             msg = 'Error connecting to AWS' + str(e)
             list = [msg]
@@ -306,13 +315,13 @@ def listgroups():
     )
 
 
-def list_groups(logs_client, loggroupfilter):
+def list_groups(loggroupfilter):
     list = []
     i = 0
     """Lists available CloudWatch logs groups"""
-    for group in get_groups(logs_client, loggroupfilter):
+    log_output = app.config.get('log_output')
+    for group in get_cached_groups(loggroupfilter):
 
-        log_output = app.config.get('log_output')
         if log_output:
             print(group)
         else:
@@ -323,16 +332,20 @@ def list_groups(logs_client, loggroupfilter):
                 print(':', end="")
                 i = 0
 
-        print(group)
         list.append(group)
 
     return list
 
-from datetime import datetime
-
 def getCurrentTimestamp():
     return datetime.now().strftime('%Y%m%d%H%M%S%f')
 
+# log groups are rarely created, reuse the full describe_log_groups scan for
+# the same prefix instead of paging through the account on every search
+@aws_utils.ttl_cache(ttl_seconds=300)
+def get_cached_groups(loggroupfilter):
+    logs_client = aws_utils.get_boto3_client('logs')
+    return tuple(get_groups(logs_client, loggroupfilter))
+
 def get_groups(logs_client, loggroupfilter):
     log_group_prefix = loggroupfilter
     print('log_group_prefix {0}'.format(log_group_prefix))
@@ -341,8 +354,6 @@ def get_groups(logs_client, loggroupfilter):
     if log_group_prefix is not None:
         kwargs = {'logGroupNamePrefix': log_group_prefix}
     paginator = logs_client.get_paginator('describe_log_groups')
-    for attr in dir(paginator):
-        print("obj.%s = %r" % (attr, getattr(paginator, attr)))
     for page in paginator.paginate(**kwargs):
         for group in page.get('logGroups', []):
             yield group['logGroupName']
@@ -352,6 +363,13 @@ def uploaddir(local_directory, bucket, destination, kms_key_up_folder):
     #s3 = boto3.client('s3')
     s3 = aws_utils.get_boto3_client('s3')
     msg ='Message: Nothing to upload or uploaded.'
+    try:
+        existing_keys = get_existing_keys(s3, bucket, destination)
+    except botocore.exceptions.ClientError as e:
+        msg = 'Message: AWS Error' + str(e)
+        print(msg)
+        traceback.print_exc()
+        return msg
     # enumerate local files recursively
     for root, dirs, files in os.walk(local_directory):
         for filename in files:
@@ -366,40 +384,44 @@ def uploaddir(local_directory, bucket, destination, kms_key_up_folder):
             # relative_path = os.path.relpath(os.path.join(root, filename))
 
             print('Searching "%s" in "%s"' % (s3_path, bucket))
-            try:
-                s3.head_object(Bucket=bucket, Key=s3_path)
+            if s3_path in existing_keys:
                 print("Path found on S3! Skipping %s..." % s3_path)
 
                 # try:
                 # client.delete_object(Bucket=bucket, Key=s3_path)
                 # except:
                 # print "Unable to delete %s..." % s3_path
-            except Exception as e:
-                # this is expected.
-                if 'HeadObject operation: Not Found' in e.args[0]:
-                    print("Uploading %s..." % s3_path)
-                    try:
-                        if isEmptyStr(kms_key_up_folder):
-                            s3.upload_file(local_path, bucket, s3_path)
-                        else:
-                            sse_args_copy = sse_args.copy()
-                            sse_args_copy['SSEKMSKeyId'] = kms_key_up_folder
-                            s3.upload_file(local_path, bucket, s3_path, ExtraArgs=sse_args_copy)
-
-                        msg = 'Upload done!'
-                    except botocore.exceptions.ClientError as e:
-                        msg = 'Message: AWS Error' + str(e)
-                        print(msg)
-                        traceback.print_exc()
-                    except Exception as e:
-                        msg = 'Message: Error connecting to AWS' + str(e)
-                        traceback.print_exc()
-                else:
+            else:
+                print("Uploading %s..." % s3_path)
+                try:
+                    if isEmptyStr(kms_key_up_folder):
+                        s3.upload_file(local_path, bucket, s3_path)
+                    else:
+                        sse_args_copy = sse_args.copy()
+                        sse_args_copy['SSEKMSKeyId'] = kms_key_up_folder
+                        s3.upload_file(local_path, bucket, s3_path, ExtraArgs=sse_args_copy)
+
+                    msg = 'Upload done!'
+                except botocore.exceptions.ClientError as e:
                     msg = 'Message: AWS Error' + str(e)
                     print(msg)
                     traceback.print_exc()
+                except Exception as e:
+                    msg = 'Message: Error connecting to AWS' + str(e)
+                    traceback.print_exc()
     return msg
 
+# one listing of the destination instead of a head_object round trip per local file.
+# uploaded keys are always destination/..., the trailing slash keeps sibling
+# prefixes such as destination2/ out of the listing
+def get_existing_keys(s3, bucket, destination):
+    existing_keys = set()
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=destination.replace('\\', '/').rstrip('/') + '/'):
+        for item in page.get('Contents', []):
+            existing_keys.add(item['Key'])
+    return existing_keys
+
 @app.route("/download", methods=['POST'])
 def download():
     msg = ''
@@ -503,6 +525,7 @@ def download_s3_folder(s3_folder, bucket_name, dir=None):
     """
     s3 = aws_utils.get_boto3_resource('s3') #boto3.resource('s3')
     bucketFolder = s3.Bucket(bucket_name)
+    downloads = []
     for obj in bucketFolder.objects.filter(Prefix = s3_folder):
         windowspath = obj.key.split(s3_folder)[1].replace('/', '\\')
         target = dir + windowspath
@@ -511,17 +534,28 @@ def download_s3_folder(s3_folder, bucket_name, dir=None):
         if not os.path.exists(os.path.dirname(target)):
             os.makedirs(os.path.dirname(target))
         print(obj.key)
-        try:
-            bucketFolder.download_file(obj.key, target)
-        except botocore.exceptions.ClientError as e:
-            #traceback.print_exc()
-            if e.response['Error']['Code'] == "404":
-                print("The object does not exist.")
-                raise ValueError("The object does not exist.")
-            else:
-                msg = 'AWS Error : '
-                print( msg + str(e))
-                raise ValueError(msg)
+        downloads.append((obj.key, target))
+
+    # files are downloaded concurrently, resources are not thread safe so the
+    # workers share the client instead. map re-raises the first failed download
+    s3_client = aws_utils.get_boto3_client('s3')
+    with ThreadPoolExecutor(max_workers=aws_utils.MAX_WORKERS) as executor:
+        for _ in executor.map(lambda download: download_s3_object(s3_client, bucket_name, download[0], download[1]),
+                              downloads):
+            pass
+
+def download_s3_object(s3_client, bucket_name, key, target):
+    try:
+        s3_client.download_file(bucket_name, key, target)
+    except botocore.exceptions.ClientError as e:
+        #traceback.print_exc()
+        if e.response['Error']['Code'] == "404":
+            print("The object does not exist.")
+            raise ValueError("The object does not exist.")
+        else:
+            msg = 'AWS Error : '
+            print( msg + str(e))
+            raise ValueError(msg)
 
 
 
@@ -566,7 +600,6 @@ def locals3copy():
             msg = 'Source or Target folder is empty'
             return msg
 
-import subprocess
 def runtime_exec(command,shell=False):
     msg = {}
     try:
@@ -691,10 +724,8 @@ def getlogs():
             #logs_client = boto3.client("logs")
             logs_client = aws_utils.get_boto3_client('logs')
             #list_streams(logs_client, loggroup, parse_datetime(starttime), parse_datetime(endtime))
-            memory_file, zipfileName, fileName = list_logs_extend_window(logs_client,loggroup, parse_datetime_est_to_equivalent_utc(starttime), parse_datetime_est_to_equivalent_utc(endtime), log_type, stream_args, window)
-            if memory_file:
-                os.remove(fileName)
-                return send_file(memory_file, mimetype='application/zip', attachment_filename=zipfileName, as_attachment=True)
+            zip_stream, zipfileName = list_logs_extend_window(logs_client,loggroup, parse_datetime_est_to_equivalent_utc(starttime), parse_datetime_est_to_equivalent_utc(endtime), log_type, stream_args, window)
+            return zip_response(zip_stream, zipfileName)
         except botocore.exceptions.ClientError as e:
             #traceback.print_exc()
             if e.response['Error']['Code'] == "404":
@@ -743,10 +774,13 @@ def get_streams(logs_client, log_group_name, start, end):
                     min(stream['lastIngestionTime'], window_end):
                 yield stream['logStreamName']
 
-import re
-from datetime import datetime, timedelta
-from dateutil.parser import parse
-from dateutil.tz import tzutc
+
+# relative times like '15m', '2 hours ago'
+AGO_REGEXP = re.compile(r'(\d+)\s?(m|minute|minutes|h|hour|hours|d|day|days|w|weeks|weeks)(?: ago)?')
+# seconds per unit, keyed on the unit's first letter
+AGO_UNIT_SECONDS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+UTC = tzutc()
+EPOCH = datetime(1970, 1, 1)
 
 def parse_datetime(datetime_text):
     """Parse ``datetime_text`` into a ``datetime``."""
@@ -754,13 +788,12 @@ def parse_datetime(datetime_text):
     if not datetime_text:
         return None
 
-    ago_regexp = r'(\d+)\s?(m|minute|minutes|h|hour|hours|d|day|days|w|weeks|weeks)(?: ago)?'
-    ago_match = re.match(ago_regexp, datetime_text)
+    ago_match = AGO_REGEXP.match(datetime_text)
 
     if ago_match:
         amount, unit = ago_match.groups()
         amount = int(amount)
-        unit = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}[unit[0]]
+        unit = AGO_UNIT_SECONDS[unit[0]]
         date = datetime.utcnow() + timedelta(seconds=unit * amount * -1)
     else:
         try:
@@ -770,10 +803,10 @@ def parse_datetime(datetime_text):
 
     if date.tzinfo:
         if date.utcoffset != 0:
-            date = date.astimezone(tzutc())
+            date = date.astimezone(UTC)
         date = date.replace(tzinfo=None)
 
-    return int(total_seconds(date - datetime(1970, 1, 1))) * 1000
+    return int(total_seconds(date - EPOCH)) * 1000
 
 
 def parse_datetime_est_to_equivalent_utc(datetime_text):
@@ -782,23 +815,22 @@ def parse_datetime_est_to_equivalent_utc(datetime_text):
     if not datetime_text:
         return None
 
-    ago_regexp = r'(\d+)\s?(m|minute|minutes|h|hour|hours|d|day|days|w|weeks|weeks)(?: ago)?'
-    ago_match = re.match(ago_regexp, datetime_text)
+    ago_match = AGO_REGEXP.match(datetime_text)
 
     if ago_match:
         amount, unit = ago_match.groups()
         amount = int(amount)
-        unit = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}[unit[0]]
+        unit = AGO_UNIT_SECONDS[unit[0]]
         date = datetime.utcnow() + timedelta(seconds=unit * amount * -1)
     else:
         try:
             date = parse(datetime_text)
         except ValueError:
             raise ValueError(datetime_text)
-    date = date.astimezone(tzutc())
+    date = date.astimezone(UTC)
     date = date.replace(tzinfo=None)
     print( date.strftime('%m/%d/%Y %H:%M:%S'))
-    return int(total_seconds(date - datetime(1970, 1, 1))) * 1000
+    return int(total_seconds(date - EPOCH)) * 1000
 
 def total_seconds(delta):
     """
@@ -822,10 +854,6 @@ def total_seconds(delta):
     return day_in_seconds + delta.seconds + micro_in_seconds
 
 
-from collections import deque
-from botocore.compat import json, total_seconds
-import errno
-
 #  The default is 10,000 events.
 MAX_EVENTS_PER_CALL = 10000
 
@@ -835,9 +863,6 @@ MAX_EVENTS_PER_CALL = 10000
 def list_logs_extend_window(client, log_group_name,start, end, log_type, streams, window=0):
     return list_logs(client, log_group_name, (start - window), (end + window), log_type, streams)
 
-import time
-import io
-import zipfile
 
 def list_logs(client, log_group_name,start, end, log_type, streams):
     #streams = []
@@ -845,19 +870,20 @@ def list_logs(client, log_group_name,start, end, log_type, streams):
     nl = "\n"
     logfileName = "cloudwatchlogs" + timestr + ".log"
     zipfileName = "cloudwatchlogs" + timestr + ".zip"
-    fileName = getLocalDir() #"c:/tmp")
-    fileName = fileName + os.sep + logfileName
 
-    print(" log file name : {0}".format(fileName))
+    print(" log file name : {0}".format(logfileName))
 
     # Note: filter_log_events paginator is broken
     # ! Error during pagination: The same next token was received twice
     do_wait = object()
+    page_end = object()
     watch = 'watch'
     watch_interval = 1
     def generator():
         # ref: https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/logs.html
         interleaving_sanity = deque(maxlen=MAX_EVENTS_PER_CALL)
+        # same ids as the deque, for O(1) lookups instead of scanning up to 10k ids per event
+        interleaving_sanity_ids = set()
         # interleaved (boolean)
         # If the value is true, the operation makes a best effort to provide responses that contain events from multiple log streams
         # within the log group, interleaved in a single response.
@@ -887,9 +913,13 @@ def list_logs(client, log_group_name,start, end, log_type, streams):
             response = client.filter_log_events(**kwargs)
 
             for event in response.get('events', []):
-                if event['eventId'] not in interleaving_sanity:
+                if event['eventId'] not in interleaving_sanity_ids:
+                    if len(interleaving_sanity) == MAX_EVENTS_PER_CALL:
+                        interleaving_sanity_ids.discard(interleaving_sanity[0])
                     interleaving_sanity.append(event['eventId'])
+                    interleaving_sanity_ids.add(event['eventId'])
                     yield event
+            yield page_end
 
             if 'nextToken' in response:
                 kwargs['nextToken'] = response['nextToken']
@@ -899,71 +929,60 @@ def list_logs(client, log_group_name,start, end, log_type, streams):
     query= None
     query_expression = None
 
+    # yields the log file content one page at a time, straight into the zip stream
     def consumer():
-        f = open(fileName, "w")
         i = 0
+        page_lines = []
+        log_output = app.config.get('log_output')
         for event in generator():
+            if event is page_end:
+                # one zip write per page instead of one per event
+                if page_lines:
+                    yield ''.join(page_lines).encode('utf-8')
+                    page_lines = []
+                # progress marker per page, printing per event made the console the bottleneck
+                if not log_output:
+                    if i == 0:
+                        print('.', end ="", flush=True)
+                        i = 1
+                    else:
+                        print(':', end ="", flush=True)
+                        i = 0
+                continue
             if event is do_wait:
+                print('Download complete!')
+                print('------------------------------------------------------------------------------------------')
                 return
 
-            output = []
             message = event['message']
             if query is not None and message[0] == '{':
                 parsed = json.loads(event['message'])
                 message = query_expression.search(parsed)
                 if not isinstance(message, str):
                     message = json.dumps(message)
-            output.append(message.rstrip())
+            # strip once, the same line is printed and written
+            line = message.rstrip()
 
-            log_output = app.config.get('log_output')
             if log_output:
-                print(' '.join(output))
-            else :
-                if i == 0:
-                    print('.', end ="")
-                    i = 1
-                else:
-                    print(':', end ="")
-                    i = 0
-
-            f.write(' '.join(output)+ nl)
-
-            try:
-                if log_output:
-                    sys.stdout.flush()
-                f.flush()
-            except IOError as e:
-                f.close()
-                os.remove(fileName)
-                if e.errno == errno.EPIPE:
-                    # SIGPIPE received, so exit
-                    os._exit(0)
-                else:
-                    # We don't want to handle any other errors from this
-                    raise
-        f.flush()
-        f.close()
-    try:
-        print('Download started!')
-        print('------------------------------------------------------------------------------------------')
-        consumer()
-        print('Download complete!')
-        print('------------------------------------------------------------------------------------------')
-        memory_file = io.BytesIO()
-        with zipfile.ZipFile(memory_file, 'w') as zf:
-            #data = zipfile.ZipInfo(fileName)
-            #data.date_time = time.localtime(time.time())[:6]
-            #data.compress_type = zipfile.ZIP_DEFLATED
-            #zf.writestr(data, fileName)
-            zf.write(fileName)
-        memory_file.seek(0)
-        return memory_file, zipfileName, fileName
-    except KeyboardInterrupt:
-        print('Closing...\n')
-        os._exit(0)
-    except :
-        traceback.print_exc()
-        raise
+                print(line)
+
+            page_lines.append(line)
+            page_lines.append(nl)
+
+    print('Download started!')
+    print('------------------------------------------------------------------------------------------')
+    lines = consumer()
+    # pull the first page before the response starts, so aws errors are still reported by the caller
+    first_line = next(lines, None)
+    if first_line is not None:
+        lines = itertools.chain([first_line], lines)
+    return aws_utils.stream_zip(logfileName, lines), zipfileName
+
+# sends the zip chunks to the browser as they are produced, the chunks are
+# already bytes so werkzeug hands them to the server without re-encoding
+def zip_response(zip_stream, zipfileName):
+    return Response(zip_stream, mimetype='application/zip', direct_passthrough=True,
+                    headers={'Content-Disposition': 'attachment; filename={0}'.format(zipfileName)})
 
 def milis2iso(milis):
     res = datetime.utcfromtimestamp(milis/1000.0).isoformat()
@@ -985,6 +1004,53 @@ def isEmptyStr(str_value):
         return False
 
 
+def get_s3_file_status(s3, paginator, s3_bucket, prefixes, apply_filter_arr, latest_files):
+    resp = []
+    operation_parameters = {"Bucket": s3_bucket, "Prefix": "@@"}
+    operation_parameters["Prefix"] = prefixes
+    # print(operation_parameters)
+    page_iterator = paginator.paginate(**operation_parameters)
+    for page in page_iterator:
+        if 'Contents' not in page:
+            resp.append('Not found: {}'.format(page['Prefix']))
+            continue;
+        all = page['Contents']
+        if latest_files:
+            latest = max(all, key=lambda x: x['LastModified'])
+            file_name = latest['Key'].split('/')[-1]
+            # the name filter is free, only fetch metadata for files it keeps
+            if not any(filter in file_name for filter in apply_filter_arr):
+                continue
+            metadata = '';
+            try:
+                metadata = s3.head_object(Bucket=BUCKET_NAME, Key=latest['Key'])
+                print(metadata)
+            except:
+                print("Failed metadata {}".format(latest['Key']))
+
+            val = file_name + " , " + str(latest['LastModified']) + " , " + str(metadata['Metadata'])
+            print(val)
+            resp.append(val)
+        else:
+            for file in all:
+                file_name = file['Key'].split('/')[-1]
+                if not any(filter in file_name for filter in apply_filter_arr):
+                    continue
+                metadata = '';
+                try:
+                    metadata = s3.head_object(Bucket=BUCKET_NAME, Key=file['Key'])
+                    print(metadata)
+                except:
+                    print("Failed metadata {}".format(file['Key']))
+
+                val = file_name + " , " + str(file['LastModified']) + " , " + str(
+                    metadata['Metadata'])
+                print(val)
+                resp.append(val)
+
+    return resp
+
+
 @app.route('/checks3filestatus',methods=['post'])
 def checkS3FileStatus():
     msg = {}
@@ -1003,52 +1069,21 @@ def checkS3FileStatus():
             else:
                 latest_files = False
 
-            list_of_paths_arr = list_of_paths.split(",")
+            # each distinct prefix is listed once, a repeated prefix gives the same
+            # answer and a blank one from a trailing comma would list the whole bucket
+            list_of_paths_arr = [prefixes for prefixes in
+                                 dict.fromkeys(prefixes.strip('\n').strip('\r') for prefixes in list_of_paths.split(","))
+                                 if prefixes]
             apply_filter_arr = apply_filter.split(",")
             if list_of_paths_arr:
                 resp = []
-                for prefixes in list_of_paths_arr:
-                    prefixes = prefixes.strip('\n').strip('\r')
-                    operation_parameters = {"Bucket": s3_bucket, "Prefix": "@@"}
-                    operation_parameters["Prefix"] = prefixes
-                    # print(operation_parameters)
-                    page_iterator = paginator.paginate(**operation_parameters)
-                    for page in page_iterator:
-                        if 'Contents' not in page:
-                            resp.append('Not found: {}'.format(page['Prefix']))
-                            continue;
-                        all = page['Contents']
-                        if latest_files:
-                            latest = max(all, key=lambda x: x['LastModified'])
-                            file_name = latest['Key'].split('/')[-1]
-                            metadata = '';
-                            try:
-                                metadata = s3.head_object(Bucket=BUCKET_NAME, Key=latest['Key'])
-                                print(metadata)
-                            except:
-                                print("Failed metadata {}".format(latest['Key']))
-
-                            if not any(filter in file_name for filter in apply_filter_arr):
-                                continue
-                            val = file_name + " , " + str(latest['LastModified']) + " , " + str(metadata['Metadata'])
-                            print(val)
-                            resp.append(val)
-                        else:
-                            for file in all:
-                                file_name = file['Key'].split('/')[-1]
-                                metadata = '';
-                                try:
-                                    metadata = s3.head_object(Bucket=BUCKET_NAME, Key=file['Key'])
-                                    print(metadata)
-                                except:
-                                    print("Failed metadata {}".format(file['Key']))
-
-                                if not any(filter in file_name for filter in apply_filter_arr):
-                                    continue
-                                val = file_name + " , " + str(file['LastModified']) + " , " + str(
-                                    metadata['Metadata'])
-                                print(val)
-                                resp.append(val)
+                # every prefix is an independent listing plus metadata lookups,
+                # check them concurrently and keep the results in prefix order
+                with ThreadPoolExecutor(max_workers=aws_utils.MAX_WORKERS) as executor:
+                    for prefix_resp in executor.map(
+                            lambda prefixes: get_s3_file_status(s3, paginator, s3_bucket, prefixes, apply_filter_arr, latest_files),
+                            list_of_paths_arr):
+                        resp.extend(prefix_resp)
 
                 msg["Success"]  = resp
             else:
@@ -1069,6 +1104,69 @@ def checkS3FileStatus():
 list_header = ['JOB_QUEUE,START DATE,STOP DATE,JOB NAME,JOB ID,JOB ARN,STATUS']
 
 from awsdesktop import aws_batch_helper
+
+# the awslogs driver ships a container's last output after the job changed
+# state, allow for that before a download is trusted to be complete
+LOG_INGESTION_DELAY_SECONDS = 300
+# most zip downloads kept under local_dir/zipcache, least recently used dropped first
+ZIP_CACHE_MAX_FILES = 100
+# a .part file is written on every chunk, one untouched this long was left behind
+ZIP_CACHE_STALE_PART_SECONDS = 3600
+
+# zip downloads that can be served again are kept under local_dir/zipcache
+def get_zip_cache_file(cache_key):
+    if not local_dir:
+        return None
+    cache_dir = local_dir + os.sep + 'zipcache'
+    makeLocalDir(cache_dir)
+    return cache_dir + os.sep + hashlib.sha256(cache_key.encode('utf-8')).hexdigest() + '.zip'
+
+def evict_zip_cache(cache_dir):
+    stale_before = time.time() - ZIP_CACHE_STALE_PART_SECONDS
+    cache_files = []
+    for entry in os.scandir(cache_dir):
+        try:
+            if entry.name.endswith('.zip'):
+                cache_files.append((entry.stat().st_mtime, entry.path))
+            elif entry.name.endswith('.part') and entry.stat().st_mtime < stale_before:
+                remove_cache_file(entry.path)
+        except OSError:
+            # already removed by a concurrent download
+            pass
+    if len(cache_files) <= ZIP_CACHE_MAX_FILES:
+        return
+    cache_files.sort()
+    for mtime, path in cache_files[:len(cache_files) - ZIP_CACHE_MAX_FILES]:
+        remove_cache_file(path)
+
+def remove_cache_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        # already removed, or still open by another request on windows
+        pass
+
+# passes the zip chunks through while writing them to cache_file, the file only
+# appears once the whole archive was sent so a broken download is never served
+def save_zip_stream(zip_stream, cache_file):
+    fd, part_file = tempfile.mkstemp(suffix='.part', dir=os.path.dirname(cache_file))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in zip_stream:
+                f.write(chunk)
+                yield chunk
+    except BaseException:
+        remove_cache_file(part_file)
+        raise
+    try:
+        os.replace(part_file, cache_file)
+    except OSError as e:
+        # e.g. the cached zip is being served to another request on windows, the
+        # download itself already completed so only the caching is skipped
+        print('Could not cache {0}: {1}'.format(cache_file, e))
+        remove_cache_file(part_file)
+        return
+    evict_zip_cache(os.path.dirname(cache_file))
 @app.route("/getbatchjobinfo", methods=['GET', 'POST'])
 def getbatchjobinfo():
     list = []
@@ -1140,12 +1238,33 @@ def getbatchjoblogs():
             #endtime = job_details_map["stoppedAt"]
             logStreamName = job_details_map["logStreamName"]
             logGroup = '/aws/batch/job'
+            # same name whether the zip is fresh or served from the cache
+            zipfileName = 'cloudwatchlogs{0}.zip'.format(job_id)
+            # logs of a finished job no longer change once its last output was
+            # ingested, serve repeat downloads from disk
+            cache_file = None
+            if job_details_map["status"] in aws_batch_helper.FINISHED_JOB_STATES:
+                cache_file = get_zip_cache_file('{0}|{1}|{2}|{3}'.format(job_id, start_time, stop_time, increased_time_windows_in_seconds))
+                if cache_file and os.path.exists(cache_file):
+                    # keep recently downloaded zips from being evicted first
+                    os.utime(cache_file)
+                    # validators must not follow the file's mtime, which the line above
+                    # moves on every hit. the cache key hash and the job's stop time
+                    # only change when the zip content does
+                    return send_file(cache_file, mimetype='application/zip', attachment_filename=zipfileName,
+                                     as_attachment=True, conditional=True,
+                                     etag=os.path.splitext(os.path.basename(cache_file))[0],
+                                     last_modified=job_details_map["stoppedAt"] / 1e3)
+                stopped_seconds_ago = time.time() - job_details_map["stoppedAt"] / 1e3
+                if stopped_seconds_ago < LOG_INGESTION_DELAY_SECONDS + increased_time_windows_in_seconds:
+                    # the last events may still be on their way, do not cache this one
+                    cache_file = None
             logs_client = aws_utils.get_boto3_client('logs')
             #list_streams(logs_client, loggroup, parse_datetime(starttime), parse_datetime(endtime))
-            memory_file, zipfileName, fileName = list_logs_extend_window(logs_client,logGroup, parse_datetime_est_to_equivalent_utc(start_time), parse_datetime_est_to_equivalent_utc(stop_time), 'streams', logStreamName, increased_time_windows_in_seconds)
-            if memory_file:
-                os.remove(fileName)
-                return send_file(memory_file, mimetype='application/zip', attachment_filename=zipfileName, as_attachment=True)
+            zip_stream, _ = list_logs_extend_window(logs_client,logGroup, parse_datetime_est_to_equivalent_utc(start_time), parse_datetime_est_to_equivalent_utc(stop_time), 'streams', logStreamName, increased_time_windows_in_seconds)
+            if cache_file:
+                zip_stream = save_zip_stream(zip_stream, cache_file)
+            return zip_response(zip_stream, zipfileName)
         except botocore.exceptions.ClientError as e:
             traceback.print_exc()
             if e.response['Error']['Code'] == "404":
@@ -1300,9 +1419,6 @@ def getexecutionappid():
 
 # read from config
 
-#from . import aws_utils
-import awsdesktop.aws_utils as aws_utils
-
 def readConfigProps():
     dictConfig = None
     global BUCKET_NAME
@@ -1342,9 +1458,6 @@ def readConfigProps():
 
 readConfigProps()
 
-import webbrowser
-
-
 log_output = None
 if len(sys.argv) > 1 :
     log_output= sys.argv[1]